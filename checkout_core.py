@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# Checkout.com logic shared by the FastAPI app (checkout_api.py) and the MCP server (Checkout MCP CLI /checkout.py).
+import os
+import asyncio
+import copy
+import httpx
+import orjson
+from cachetools import TTLCache
+import time
+from checkout_sdk.checkout_sdk import CheckoutSdk
+from checkout_sdk.environment import Environment
+from checkout_sdk.exception import CheckoutException
+from checkout_sdk.payments.payments import PaymentsQueryFilter
+from checkout_sdk.payments.links.payments_links import PaymentLinkRequest
+from checkout_sdk.payments.payments_previous import BillingInformation
+from checkout_sdk.common.common import Address, Phone
+from checkout_sdk.customers.customers import CustomerRequest
+
+# ---- Checkout Client ----
+# IMPORTANT: no hard-coded secrets here — set these in environment vars on Railway / locally via .env
+CKO_SECRET_KEY = os.getenv("CKO_SECRET_KEY")
+CKO_PUBLIC_KEY = os.getenv("CKO_PUBLIC_KEY")
+
+# optional: quick runtime check to help debugging if secrets are missing in deployment
+if not CKO_SECRET_KEY or not CKO_PUBLIC_KEY:
+    # Do NOT expose secret values — just raise a useful error so you don't forget to set them.
+    raise RuntimeError("CKO_SECRET_KEY and CKO_PUBLIC_KEY must be set in environment variables")
+
+# Keys are validated above, so the header is built exactly once.
+_AUTH_HEADER = f"Bearer {CKO_SECRET_KEY}"
+
+# --- Utility Function for Robust Phone Number Cleaning ---
+class _PhoneTable(dict):
+    """str.translate table that keeps '+' and decimal digits (same set as regex \\d) and drops everything else."""
+
+    def __missing__(self, codepoint: int):
+        # Only non-Latin-1 input gets here. Classify without storing: input is untrusted,
+        # so the table must not grow with what callers send.
+        char = chr(codepoint)
+        return char if char.isdecimal() else None
+
+
+# Pre-fill all of Latin-1 so spaces, brackets, dashes and dots in formatted numbers stay on the C path.
+_PHONE_TABLE = _PhoneTable(dict.fromkeys(range(256)))
+_PHONE_TABLE.update({ord(c): c for c in '0123456789+'})
+
+
+def clean_phone_number(number: str) -> str:
+    return number.translate(_PHONE_TABLE) if number else ""
+
+
+CKO_API_URL = "https://api.sandbox.checkout.com"
+
+
+# Built once and shared by every request so the SDK's HTTP session is reused.
+_CHECKOUT_CLIENT: CheckoutSdk | None = None
+
+
+def get_checkout_client() -> CheckoutSdk:
+    global _CHECKOUT_CLIENT
+    if _CHECKOUT_CLIENT is None:
+        _CHECKOUT_CLIENT = (
+            CheckoutSdk.builder()
+            .secret_key(CKO_SECRET_KEY)
+            .public_key(CKO_PUBLIC_KEY)
+            .environment(Environment.sandbox())
+            .build()
+        )
+    return _CHECKOUT_CLIENT
+
+
+# Pooled HTTP/2 client for the raw Checkout API calls the SDK does not cover.
+_HTTPX: httpx.AsyncClient | None = None
+
+
+def get_httpx_client() -> httpx.AsyncClient:
+    global _HTTPX
+    if _HTTPX is None:
+        _HTTPX = httpx.AsyncClient(
+            base_url=CKO_API_URL,
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            headers={
+                'Authorization': _AUTH_HEADER,
+                'Content-Type': 'application/json'
+            },
+        )
+    return _HTTPX
+
+
+def _warm_up_sdk() -> None:
+    checkout = get_checkout_client()
+    query = PaymentsQueryFilter()
+    query.reference = "warm-up"
+    query.limit = 1
+    try:
+        # A cheap list call opens and pools the SDK's requests.Session connection.
+        checkout.payments.get_payments_list(query)
+    except CheckoutException as e:
+        print(f"Checkout SDK warm-up request failed: {e}")
+
+
+async def _warm_up_httpx() -> None:
+    try:
+        # Any response (even 401/404) means the connection is open and pooled.
+        await get_httpx_client().get('/')
+    except httpx.HTTPError as e:
+        print(f"Checkout API warm-up request failed: {e}")
+
+
+# The SDK sets no request timeout, so an unreachable API would otherwise stall warm-up for the OS connect timeout.
+_WARM_UP_TIMEOUT = 5.0
+
+
+async def warm_up() -> None:
+    """Prime DNS, TCP and TLS for both Checkout connection pools so the first requests do not pay for them."""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(asyncio.to_thread(_warm_up_sdk), _warm_up_httpx()),
+            timeout=_WARM_UP_TIMEOUT,
+        )
+    except TimeoutError:
+        print(f"Checkout warm-up timed out after {_WARM_UP_TIMEOUT:.0f} s")
+        return
+    print(f"🔥 Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+async def close_httpx_client() -> None:
+    global _HTTPX
+    if _HTTPX is not None:
+        await _HTTPX.aclose()
+        _HTTPX = None
+
+
+# Short TTL so repeat callers within a burst share one upstream search without serving stale payments.
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=30)
+_SEARCH_CACHE_LOCK = asyncio.Lock()
+
+
+async def search_payments_by_email(email: str) -> dict:
+    async with _SEARCH_CACHE_LOCK:
+        cached = _SEARCH_CACHE.get(email)
+    if cached is not None:
+        return cached
+    try:
+        payload = {
+            "query": f"email:\"{email}\"",
+            "limit": 1
+        }
+        response = await get_httpx_client().post('/payments/search', content=orjson.dumps(payload))
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        payments = data.get('data', [])
+        latest_payment = payments[0] if payments else {}
+        async with _SEARCH_CACHE_LOCK:
+            _SEARCH_CACHE[email] = latest_payment
+        return latest_payment
+    except httpx.HTTPStatusError as e:
+        print(f"Checkout API Search Error: {e.response.status_code} - {e.response.text}")
+        return {}
+    except Exception as e:
+        print(f"Exception during payment search: {e}")
+        return {}
+
+# ---- Response Templates ----
+_REFUND_TMPL = (
+    "--- Refund Request Submitted ---\n"
+    "Payment ID: {payment_id}\n"
+    "Action ID: {action_id}\n"
+    "Reference: {reference}\n"
+    "Status: Pending"
+)
+_LOOKUP_TMPL = (
+    "--- Payment Details ({source_label}) ---\n"
+    "💳 Payment ID: {id}\n"
+    "Status: {status}\n"
+    "Amount: {amount} {currency}\n"
+    "Approved: {approved}\n"
+)
+_DECLINED_CODES_TMPL = "⚠️ Declined Response Codes: {codes}\n"
+_PAYMENT_LINK_TMPL = "--- Payment Link Created ---\n🔗 URL: {href}\nAmount: {amount} {currency}"
+
+
+# Which attribute of a payments-list response holds the results; learned from the first non-empty response.
+_LIST_ATTR: str | None = None
+
+
+def _extract_payments(list_response) -> list:
+    global _LIST_ATTR
+    if _LIST_ATTR is not None:
+        return getattr(list_response, _LIST_ATTR, None) or []
+    for attr in ('payments', 'data'):
+        payments = getattr(list_response, attr, None)
+        if payments:
+            _LIST_ATTR = attr
+            return payments
+    return []
+
+
+# ---- Tool Functions (shared by the MCP and HTTP transports) ----
+# Direct payment_id lookups are read-only and get polled during calls; tolerate ~10s of staleness.
+# Declined payments are never cached so their action codes are always resolved fresh.
+# Refunds evict their payment's entry, but only in the process that served the refund, so the cache
+# is off when uvicorn runs several workers (WEB_CONCURRENCY > 1, which checkout_api exports).
+_LOOKUP_CACHE_ENABLED = int(os.getenv("WEB_CONCURRENCY", "1")) <= 1
+_LOOKUP_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=10)
+# When each payment was last refunded, so a lookup that was already in flight cannot cache its pre-refund result.
+_REFUNDED_AT: TTLCache = TTLCache(maxsize=2048, ttl=60)
+_LOOKUP_CACHE_LOCK = asyncio.Lock()
+
+
+async def refund_payment(payment_id: str) -> str:
+    if not payment_id:
+        return "⚠️ Error: Please provide a payment ID to refund."
+    try:
+        checkout = get_checkout_client()
+        try:
+            refund_response = await asyncio.to_thread(checkout.payments.refund_payment, payment_id)
+        finally:
+            # The payment's status may have changed; do not let a follow-up lookup serve the pre-refund result.
+            async with _LOOKUP_CACHE_LOCK:
+                _LOOKUP_CACHE.pop(payment_id, None)
+                _REFUNDED_AT[payment_id] = time.monotonic()
+        if refund_response and hasattr(refund_response, 'action_id'):
+            return _REFUND_TMPL.format_map({
+                "payment_id": payment_id,
+                "action_id": getattr(refund_response, 'action_id', 'N/A'),
+                "reference": getattr(refund_response, 'reference', 'N/A'),
+            })
+        else:
+            return f"❌ Refund Failed for Payment ID {payment_id}."
+    except Exception as e:
+        return f"⚠️ Exception during refund: {e}"
+
+
+async def lookup_payment_info(payment_id: str = None, reference_number: str = None) -> str:
+    if not payment_id and not reference_number:
+        return "⚠️ Error: Provide either payment_id or reference_number."
+    if payment_id and _LOOKUP_CACHE_ENABLED:
+        async with _LOOKUP_CACHE_LOCK:
+            cached = _LOOKUP_CACHE.get(payment_id)
+        if cached is not None:
+            print(f"Payment lookup cache hit: {payment_id}")
+            return cached
+    started = time.monotonic()
+    try:
+        checkout = get_checkout_client()
+        payment_to_detail = None
+        source_label = ""
+        response_codes = []
+        actions = None
+        if payment_id:
+            # Fetch the actions alongside the details so a declined payment costs one round trip, not two.
+            payment_to_detail, actions = await asyncio.gather(
+                asyncio.to_thread(checkout.payments.get_payment_details, payment_id),
+                asyncio.to_thread(checkout.payments.get_payment_actions, payment_id),
+                return_exceptions=True,
+            )
+            if isinstance(payment_to_detail, BaseException):
+                raise payment_to_detail
+            source_label = f"Payment ID {payment_id}"
+        elif reference_number:
+            query = PaymentsQueryFilter()
+            query.reference = reference_number
+            list_response = await asyncio.to_thread(checkout.payments.get_payments_list, query)
+            payments_list = _extract_payments(list_response)
+            if not payments_list:
+                return f"🔍 No payments found for reference: {reference_number}"
+            payment_to_detail = payments_list[0]
+            source_label = f"Reference {reference_number} (first result)"
+        if getattr(payment_to_detail, 'status', None) == "Declined":
+            if actions is None:
+                actions = await asyncio.to_thread(checkout.payments.get_payment_actions, payment_to_detail.id)
+            elif isinstance(actions, BaseException):
+                raise actions
+            response_codes = [
+                getattr(item, 'response_code', 'N/A')
+                for item in getattr(actions, 'items', [])
+                if getattr(item, "authorization_type", None) == "Final"
+            ]
+        result = _LOOKUP_TMPL.format_map({
+            "source_label": source_label,
+            "id": payment_to_detail.id,
+            "status": payment_to_detail.status,
+            "amount": payment_to_detail.amount,
+            "currency": payment_to_detail.currency,
+            "approved": payment_to_detail.approved,
+        })
+        if response_codes:
+            result += _DECLINED_CODES_TMPL.format_map({"codes": ', '.join(response_codes)})
+        if payment_id and _LOOKUP_CACHE_ENABLED and payment_to_detail.status != "Declined":
+            async with _LOOKUP_CACHE_LOCK:
+                refunded_at = _REFUNDED_AT.get(payment_id)
+                # Skip if a refund landed after this lookup started, or if the lookup outlived the refund record.
+                if (refunded_at is None or refunded_at < started) and time.monotonic() - started < _REFUNDED_AT.ttl:
+                    _LOOKUP_CACHE[payment_id] = result
+        return result
+    except Exception as e:
+        return f"⚠️ Exception: {e}"
+
+
+def _fill(obj, **attrs):
+    # SDK request models take no constructor kwargs; set all fields with one dict update.
+    obj.__dict__.update(attrs)
+    return obj
+
+
+# Fields that are the same on every link; copied per request.
+_PAYMENT_LINK_TEMPLATE = _fill(PaymentLinkRequest(), description="Generated By MCP Server", capture=True)
+
+
+async def create_payment_link(amount: int, currency: str, customer_email: str, phone_country_code: str, phone_number: str, billing_country: str) -> str:
+    if not all([amount, currency, customer_email, phone_country_code, phone_number, billing_country]):
+        return "⚠️ Error: Missing required parameters."
+    try:
+        checkout_api = get_checkout_client()
+        phone = _fill(Phone(), country_code=phone_country_code, number=phone_number)
+        customer = _fill(CustomerRequest(), email=customer_email, phone=phone)
+        billing_info = _fill(BillingInformation(), address=_fill(Address(), country=billing_country))
+        payment_link = _fill(
+            copy.copy(_PAYMENT_LINK_TEMPLATE),
+            amount=amount,
+            currency=currency,
+            billing=billing_info,
+            customer=customer,
+        )
+        response = await asyncio.to_thread(checkout_api.payments_links.create_payment_link, payment_link)
+        try:
+            payment_link_url = response._links.redirect.href
+        except AttributeError:
+            return "❌ Payment link creation failed."
+        return _PAYMENT_LINK_TMPL.format_map({"href": payment_link_url, "amount": amount, "currency": currency})
+    except Exception as e:
+        return f"⚠️ Exception during payment link creation: {e}"
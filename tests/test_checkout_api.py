@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+# checkout_core refuses to import without keys; the values are never sent anywhere in these tests.
+os.environ.setdefault("CKO_SECRET_KEY", "sk_sbox_test")
+os.environ.setdefault("CKO_PUBLIC_KEY", "pk_sbox_test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import checkout_api  # noqa: E402
+
+
+@pytest.fixture
+def client(mocker):
+    searched = []
+
+    async def fake_search(email):
+        searched.append(email)
+        return {}
+
+    mocker.patch.object(checkout_api, "search_payments_by_email", fake_search)
+    # No `with` block, so the lifespan (SDK build and network warm-up) is not run.
+    test_client = TestClient(checkout_api.app)
+    test_client.searched = searched
+    return test_client
+
+
+def _webhook(target):
+    return {"data": {"payload": {"telnyx_end_user_target": target}}}
+
+
+@pytest.mark.parametrize("target", ["+15551234567", "1 (555) 123-4567", "+971 54 713 7304"])
+def test_get_user_context_maps_known_number(client, target):
+    response = client.post("/get-user-context", json=_webhook(target))
+    assert response.status_code == 200
+    variables = response.json()["dynamic_variables"]
+    assert variables["customer_name"] == "Asma Hawari"
+    assert variables["customer_email"] == "asma.hawari@checkout.com"
+    assert client.searched == ["asma.hawari@checkout.com"]
+
+
+def test_get_user_context_unknown_number(client):
+    response = client.post("/get-user-context", json=_webhook("+44 20 7946 0000"))
+    assert response.status_code == 200
+    variables = response.json()["dynamic_variables"]
+    assert variables["lookup_result"] == "not_found"
+    assert variables["customer_name"] == "Valued Customer"
+    assert variables["customer_email"] == "unknown@example.com"
+
+
+@pytest.mark.parametrize("target", [5551234567, ["15551234567"], {"number": "15551234567"}, True])
+def test_get_user_context_rejects_non_string_target(client, target):
+    response = client.post("/get-user-context", json=_webhook(target))
+    assert response.status_code == 200
+    variables = response.json()["dynamic_variables"]
+    assert variables["lookup_result"] == "error"
+    assert "must be a string" in variables["error_message"]
+    assert client.searched == []
+
+
+def test_startup_does_not_wait_for_warm_up(mocker):
+    started = []
+
+    async def hanging_warm_up():
+        started.append(True)
+        await asyncio.Event().wait()
+
+    mocker.patch.object(checkout_api, "warm_up", hanging_warm_up)
+    with TestClient(checkout_api.app) as test_client:
+        assert test_client.get("/health").json() == {"status": "ok"}
+    assert started == [True]
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import re
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault("CKO_SECRET_KEY", "sk_sbox_test")
+os.environ.setdefault("CKO_PUBLIC_KEY", "pk_sbox_test")
+
+import pytest  # noqa: E402
+
+import checkout_core  # noqa: E402
+
+_OLD_PHONE_RE = re.compile(r'[^\d\+]+')
+
+
+@pytest.mark.parametrize("number", [
+    "+971547137304",
+    "+1 (555) 123-4567",
+    " 555.123.4567 ext ",
+    "++44\t20\n7946",
+    "\u0663\u0664\u0665-\u0967\u0968",  # Arabic-Indic and Devanagari digits are \d too
+    "\u00b2\u00bd\u00e9+1",  # Latin-1 non-digits: superscript two, one half, e-acute
+    "\u2212\uff11\U0001d7ce",  # minus sign, fullwidth one, mathematical bold zero
+])
+def test_clean_phone_number_matches_old_regex(number):
+    assert checkout_core.clean_phone_number(number) == _OLD_PHONE_RE.sub('', number).strip()
+
+
+def test_clean_phone_number_does_not_grow_table():
+    size = len(checkout_core._PHONE_TABLE)
+    checkout_core.clean_phone_number("\u0663\u4e00\U0001f600")
+    assert len(checkout_core._PHONE_TABLE) == size
+
+
+@pytest.fixture
+def payment(mocker):
+    payment = SimpleNamespace(id="pay_123", status="Captured", amount=1000, currency="USD", approved=True)
+    payments = mocker.Mock()
+    payments.get_payment_details.side_effect = lambda payment_id: payment
+    payments.get_payment_actions.return_value = SimpleNamespace(items=[])
+    payments.refund_payment.return_value = SimpleNamespace(action_id="act_1", reference="ref")
+    mocker.patch.object(checkout_core, "get_checkout_client", return_value=SimpleNamespace(payments=payments))
+    mocker.patch.object(checkout_core, "_LOOKUP_CACHE_ENABLED", True)
+    checkout_core._LOOKUP_CACHE.clear()
+    checkout_core._REFUNDED_AT.clear()
+    payment.api = payments
+    return payment
+
+
+def test_refund_evicts_cached_lookup(payment):
+    async def flow():
+        before = await checkout_core.lookup_payment_info(payment_id="pay_123")
+        await checkout_core.refund_payment("pay_123")
+        payment.status = "Refunded"
+        after = await checkout_core.lookup_payment_info(payment_id="pay_123")
+        return before, after
+
+    before, after = asyncio.run(flow())
+    assert "Status: Captured" in before
+    assert "Status: Refunded" in after
+    assert payment.api.get_payment_details.call_count == 2
+
+
+def test_lookup_in_flight_during_refund_is_not_cached(payment):
+    details_called = threading.Event()
+    release_details = threading.Event()
+
+    def slow_details(payment_id):
+        details_called.set()
+        release_details.wait(5)
+        return SimpleNamespace(**vars(payment))
+
+    payment.api.get_payment_details.side_effect = slow_details
+
+    async def flow():
+        lookup = asyncio.create_task(checkout_core.lookup_payment_info(payment_id="pay_123"))
+        await asyncio.to_thread(details_called.wait, 5)
+        await checkout_core.refund_payment("pay_123")
+        release_details.set()
+        return await lookup
+
+    assert "Status: Captured" in asyncio.run(flow())
+    assert "pay_123" not in checkout_core._LOOKUP_CACHE
+
+
+def test_lookup_cache_disabled_with_multiple_workers(payment, mocker):
+    mocker.patch.object(checkout_core, "_LOOKUP_CACHE_ENABLED", False)
+
+    async def flow():
+        await checkout_core.lookup_payment_info(payment_id="pay_123")
+        await checkout_core.lookup_payment_info(payment_id="pay_123")
+
+    asyncio.run(flow())
+    assert payment.api.get_payment_details.call_count == 2
+    assert "pay_123" not in checkout_core._LOOKUP_CACHE